@@ -1,18 +1,76 @@
 """A Wrapper on requests.Session with persistence across script runs(caching in a file)
 and login helper that can help python scripts to login to sites"""
+import atexit
+import gzip
+import json
 import logging
 import logging.config
 import os
-import pickle
+import queue
+import sys
 import tempfile
-from datetime import datetime
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from collections import OrderedDict
 from enum import Enum, auto, unique
+from http.cookiejar import Cookie
+from typing import NamedTuple
 
 import requests
 
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 
 DEFAULT_USER_AGENT = 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:68.0) Gecko/20100101 Firefox/68.0'
 DEFAULT_CACHE_TIMEOUT = 60 * 60
+# minimum gap in seconds between two cache writes triggered by requests
+DEFAULT_FLUSH_INTERVAL = 1.0
+# max number of pending background cache writes per session
+WRITER_QUEUE_SIZE = 8
+# seconds for which a login check result is reused
+LOGIN_CHECK_TTL = 5
+LOG_FILE_PATH = os.path.join(tempfile.gettempdir(), __package__ + '.log')
+
+LOGGER = logging.getLogger(__package__)
+# console handler attached to `LOGGER` by `Session.init_logger`
+_CONSOLE_HANDLER = None
+
+# cache file headers identifying the compression used for serialized data
+LZ4_MAGIC = b'LZ4P'
+GZIP_MAGIC = b'GZPP'
+# headers identifying the serialization format inside compressed data
+MSGPACK_MAGIC = b'MP'
+JSON_MAGIC = b'JS'
+# json object key marking a latin-1 decoded bytes value
+JSON_BYTES_TAG = '__bytes__'
+# `http.cookiejar.Cookie` attributes, in the order cookies are serialized
+COOKIE_FIELDS = (
+    'version', 'name', 'value', 'port', 'port_specified', 'domain', 'domain_specified',
+    'domain_initial_dot', 'path', 'path_specified', 'secure', 'expires', 'discard', 'comment',
+    'comment_url', 'rfc2109')
+# session attributes restored from cache, cache settings are kept from the initializer
+SESSION_STATE_KEYS = ('cookies', 'headers', 'proxies', 'auth')
+# max number of live sessions kept by `Session.from_pool`
+MAX_POOL_SIZE = 16
+
+# live sessions by cache file path, least recently used first
+_POOL = OrderedDict()
+_POOL_LOCK = threading.Lock()
+# queues of running background cache writers
+_WRITER_QUEUES = set()
+# sessions with changes not yet cached, flushed at exit as trailing timers don't outlive it
+_DIRTY_SESSIONS = weakref.WeakSet()
 
 
 @unique
@@ -44,35 +102,196 @@ class LoginStatus(Enum):
     FAILURE = 'Login Failed'
 
 
-class LoginResponse(requests.Response):
-    """requests response wrapper with login status"""
-
-    def __init__(self, login_status: LoginStatus, response: requests.Response = None):
-        """initializer
-
-        Arguments:
-            login_status {LoginStatus} -- login status
-        """
-        super().__init__()
-        self.login_status = login_status
-        if response:
-            self.__dict__.update(response.__dict__)
+class LoginResponse(NamedTuple):
+    """login status with the requests response of login request"""
+    login_status: LoginStatus
+    response: requests.Response = None
 
 
 def get_temp_file_path(prefix, suffix) -> str:
-    """get a temporary file path
+    """get a temporary file path, the file itself is not created
     Returns:
         {str} -- file path
     """
-    temp_file = file_path = None
+    return os.path.join(tempfile.gettempdir(), '{}-{}{}'.format(prefix, uuid.uuid4().hex, suffix))
+
+
+def compress(data: bytes) -> bytes:
+    """compress data with lz4 if available else gzip, prefixed with a magic header
+
+    Arguments:
+        data {bytes} -- data to compress
+    Returns:
+        {bytes} -- compressed data
+    """
+    if lz4:
+        return LZ4_MAGIC + lz4.frame.compress(data)
+    return GZIP_MAGIC + gzip.compress(data, compresslevel=1)
+
+
+def decompress(data: bytes) -> bytes:
+    """decompress data produced by `compress`
+
+    Arguments:
+        data {bytes} -- compressed data
+    Raises:
+        ValueError -- if data is not recognized or can't be decompressed
+    Returns:
+        {bytes} -- decompressed data
+    """
+    magic, payload = data[:len(LZ4_MAGIC)], data[len(LZ4_MAGIC):]
     try:
-        temp_file = tempfile.NamedTemporaryFile(
-            prefix=prefix, suffix=suffix, delete=False)
-        file_path = temp_file.name()
-    finally:
-        if temp_file:
-            temp_file.close()
-    return file_path
+        if magic == LZ4_MAGIC and lz4:
+            return lz4.frame.decompress(payload)
+        if magic == GZIP_MAGIC:
+            return gzip.decompress(payload)
+    except (OSError, EOFError, RuntimeError, zlib.error) as err:
+        raise ValueError('invalid compressed data') from err
+    raise ValueError('unknown data format')
+
+
+def atomic_write(file_path: str, data: bytes, fsync: bool = False):
+    """write data to a temporary file and swap it in, so readers never see a partial file
+
+    Arguments:
+        file_path {str} -- file path
+        data {bytes} -- data to write
+
+    Keyword Arguments:
+        fsync {bool} -- flush data to disk before swapping it in (default: {False})
+    """
+    # a unique temporary file per write, concurrent writers can't clobber each other's file
+    file_descriptor, temp_file_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(file_path)),
+        prefix=os.path.basename(file_path) + '.', suffix='.tmp')
+    try:
+        with open(file_descriptor, "wb") as file:
+            file.write(data)
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_file_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_file_path)
+        except OSError:
+            pass
+        raise
+
+
+def _write_cache_file(item: tuple):
+    """write a (session state, file path, data) item queued by `Session.cache_session`"""
+    state, file_path, data = item
+    try:
+        atomic_write(file_path, data)
+    except Exception:  # pylint: disable=broad-except
+        # writer thread must keep serving the queue, otherwise waiting for it never returns
+        LOGGER.exception('Failed to write cache file')
+        # file on disk doesn't match the saved hash, make next save rewrite it
+        state.last_hash = None
+
+
+def _write_cache_files(writer_queue: queue.Queue):
+    """write items from queue until a `None` item is received"""
+    while True:
+        item = writer_queue.get()
+        try:
+            if item is None:
+                return
+            _write_cache_file(item)
+        finally:
+            writer_queue.task_done()
+
+
+@atexit.register
+def _finish_cache_writes():
+    """cache sessions with pending changes and wait for background cache writes, trailing
+    flush timers and daemon writer threads are killed at exit"""
+    for session in list(_DIRTY_SESSIONS):
+        try:
+            session.flush_session(force=True)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('Failed to cache session at exit')
+    for writer_queue in list(_WRITER_QUEUES):
+        writer_queue.join()
+
+
+def _json_default(obj):
+    """encode bytes (e.g. header values, auth) as a tagged latin-1 string"""
+    if isinstance(obj, bytes):
+        return {JSON_BYTES_TAG: obj.decode('latin-1')}
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(obj).__name__))
+
+
+def _json_object_hook(obj: dict):
+    """decode bytes encoded by `_json_default`"""
+    if len(obj) == 1 and JSON_BYTES_TAG in obj:
+        return obj[JSON_BYTES_TAG].encode('latin-1')
+    return obj
+
+
+def serialize(obj) -> bytes:
+    """serialize plain data with msgpack if available else json, prefixed with a magic header
+
+    Arguments:
+        obj -- data made of dicts, lists, strings, bytes, numbers, booleans and None
+    Raises:
+        TypeError, ValueError -- if data contains other types
+    Returns:
+        {bytes} -- serialized data
+    """
+    if msgpack:
+        return MSGPACK_MAGIC + msgpack.packb(obj, use_bin_type=True)
+    return JSON_MAGIC + json.dumps(obj, separators=(',', ':'), default=_json_default).encode()
+
+
+def deserialize(data: bytes):
+    """deserialize data produced by `serialize`
+
+    Arguments:
+        data {bytes} -- serialized data
+    Raises:
+        ValueError -- if data is not recognized or malformed
+    Returns:
+        deserialized data
+    """
+    magic, payload = data[:len(MSGPACK_MAGIC)], data[len(MSGPACK_MAGIC):]
+    if magic == MSGPACK_MAGIC and msgpack:
+        return msgpack.unpackb(payload, raw=False)
+    if magic == JSON_MAGIC:
+        return json.loads(payload.decode(), object_hook=_json_object_hook)
+    raise ValueError('unknown data format')
+
+
+def cookie_to_list(cookie: Cookie) -> list:
+    """convert cookie to a list of `COOKIE_FIELDS` values followed by non-standard attributes"""
+    # pylint: disable=protected-access
+    return [getattr(cookie, field) for field in COOKIE_FIELDS] + [cookie._rest]
+
+
+def cookie_from_list(values: list) -> Cookie:
+    """create cookie from list returned by `cookie_to_list`"""
+    return Cookie(rest=values[-1], **dict(zip(COOKIE_FIELDS, values[:-1])))
+
+
+class _SessionState:
+    """cache settings and write bookkeeping of a session"""
+    __slots__ = ('cache_file_path', 'cache_timeout', 'cache_type', 'dirty', 'last_flush',
+                 'flush_interval', 'flush_timer', 'last_hash', 'writer_queue', 'lock')
+
+    def __init__(self, cache_file_path: str, cache_timeout: int, cache_type: CacheType):
+        self.cache_file_path = cache_file_path
+        self.cache_timeout = cache_timeout
+        self.cache_type = cache_type
+        self.dirty = False
+        # first write goes out at once, later ones are batched
+        self.last_flush = float('-inf')
+        self.flush_interval = DEFAULT_FLUSH_INTERVAL
+        self.flush_timer = None
+        self.last_hash = None
+        self.writer_queue = None
+        # guards the fields above, flush timer runs on another thread
+        self.lock = threading.RLock()
 
 
 class Session(requests.Session):
@@ -118,41 +337,101 @@ class Session(requests.Session):
         """
         super().__init__()
         self.init_logger(debug)
-        self.cache_file_path = cache_file_path or get_temp_file_path(
-            prefix=Session.__name__, suffix='.dat')
-        self.cache_timeout = cache_timeout
-        self.cache_type = cache_type
+        self._s = _SessionState(
+            cache_file_path or get_temp_file_path(prefix=Session.__name__, suffix='.dat'),
+            cache_timeout, cache_type)
+        self._login_cache = {}
         self.load_session()
         if proxies:
             self.proxies.update(proxies)
         if user_agent:
-            self.headers.update({'user-agent': user_agent})
+            # headers are already a fresh dict (default or restored), set the key in place
+            self.headers['user-agent'] = user_agent
+
+    @classmethod
+    def from_pool(cls, cache_file_path: str, **kwargs) -> 'Session':
+        """Get a live session for cache file path, creating one if needed. Least recently
+        used session is saved and closed when pool grows beyond `MAX_POOL_SIZE`.
+
+        Arguments:
+            cache_file_path {str} -- session cache file's path
+
+        Keyword Arguments:
+            same as initializer, only used when a new session is created
+
+        Returns:
+            Session -- Session class instance
+        """
+        with _POOL_LOCK:
+            session = _POOL.get(cache_file_path)
+            if session:
+                _POOL.move_to_end(cache_file_path)
+                return session
+            session = cls(cache_file_path, **kwargs)
+            _POOL[cache_file_path] = session
+            evicted = []
+            while len(_POOL) > MAX_POOL_SIZE:
+                evicted.append(_POOL.popitem(last=False)[1])
+        for old_session in evicted:
+            old_session.save_on_exit()
+            old_session.close()
+        return session
 
     def init_logger(self, debug):
-        """ initialize logger """
-        # create logger with package name
-        self.logger = logging.getLogger(__package__)
-        self.logger.setLevel(logging.DEBUG)
-        # create file handler which logs even debug messages
-        log_file_path = os.path.join(tempfile.gettempdir(), __package__+'.log')
-        file_handler = logging.handlers.RotatingFileHandler(
-            log_file_path, maxBytes=512000, backupCount=5)
-        file_handler.setLevel(logging.DEBUG)
-        # create console handler with a higher log level
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.DEBUG if debug else logging.ERROR)
-        # create formatter and add it to the handlers
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)-5s - %(message)s', datefmt='%d/%m/%Y %H:%M:%S')
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
-        # add the handlers to the logger
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
-        self.d = self.logger.debug
-        self.i = self.logger.info
+        """ initialize logger, handlers are attached to the package logger only once """
+        global _CONSOLE_HANDLER  # pylint: disable=global-statement
+        self.logger = LOGGER
+        if _CONSOLE_HANDLER is None:
+            LOGGER.setLevel(logging.DEBUG)
+            # create file handler which logs even debug messages,
+            # log file is opened on first emit
+            file_handler = logging.handlers.RotatingFileHandler(
+                LOG_FILE_PATH, maxBytes=512000, backupCount=5, delay=True)
+            file_handler.setLevel(logging.DEBUG)
+            # create console handler with a higher log level
+            console_handler = logging.StreamHandler()
+            console_handler.setLevel(logging.ERROR)
+            # create formatter and add it to the handlers
+            formatter = logging.Formatter(
+                '%(asctime)s - %(name)s - %(levelname)-5s - %(message)s',
+                datefmt='%d/%m/%Y %H:%M:%S')
+            file_handler.setFormatter(formatter)
+            console_handler.setFormatter(formatter)
+            # add the handlers to the logger
+            LOGGER.addHandler(file_handler)
+            LOGGER.addHandler(console_handler)
+            _CONSOLE_HANDLER = console_handler
         if debug:
-            self.d('debug logs can also be found at "%s"', log_file_path)
+            # only lower the level of our own console handler, not of handlers added by others
+            _CONSOLE_HANDLER.setLevel(logging.DEBUG)
+            LOGGER.debug('debug logs can also be found at "%s"', LOG_FILE_PATH)
+
+    @property
+    def cache_file_path(self) -> str:
+        """session cache file's path"""
+        return self._s.cache_file_path
+
+    @cache_file_path.setter
+    def cache_file_path(self, value: str):
+        self._s.cache_file_path = value
+
+    @property
+    def cache_timeout(self) -> int:
+        """session timeout in seconds"""
+        return self._s.cache_timeout
+
+    @cache_timeout.setter
+    def cache_timeout(self, value: int):
+        self._s.cache_timeout = value
+
+    @property
+    def cache_type(self) -> CacheType:
+        """type of caching, determines when session is cached"""
+        return self._s.cache_type
+
+    @cache_type.setter
+    def cache_type(self, value: CacheType):
+        self._s.cache_type = value
 
     def login(
             self,
@@ -171,9 +450,10 @@ class Session(requests.Session):
             force_login {bool} -- bypass session cache and re-login (default: {False})
 
         Returns:
-            {LoginResponse} -- requests response with login status
+            {LoginResponse} -- login status with requests response
         """
-        self.i('Try to Login - %s', url)
+        LOGGER.info('Try to Login - %s', url)
+        self._login_cache.pop(url, None)
         res = self.post(url, data, **kwargs)
 
         if self.is_logged_in(url):
@@ -203,10 +483,133 @@ class Session(requests.Session):
         """save on exit"""
         if not hasattr(self, 'cache_type') or not hasattr(self, 'cache_session'):
             return
-        if self.cache_type != CacheType.AT_EXIT:
+        if self.cache_type == CacheType.AT_EXIT:
+            self.cache_session()
+            self.close()
+        elif self._s.dirty:
+            self.cache_session()
+        self.stop_writer()
+
+    def wait_for_writes(self):
+        """block until pending background cache writes are done"""
+        writer_queue = self._s.writer_queue
+        if not writer_queue:
+            return
+        if not sys.is_finalizing():
+            writer_queue.join()
+            return
+        # daemon writer thread no longer runs at interpreter exit, joining would block forever
+        while True:
+            try:
+                item = writer_queue.get_nowait()
+            except queue.Empty:
+                return
+            if item:
+                _write_cache_file(item)
+
+    def stop_writer(self):
+        """finish pending background cache writes and stop the writer thread, a new one is
+        started by the next background write"""
+        state = getattr(self, '_s', None)
+        if not state:
             return
-        self.cache_session()
-        self.close()
+        with state.lock:
+            if state.writer_queue:
+                self.wait_for_writes()
+                # queue is empty now, so this doesn't block
+                state.writer_queue.put(None)
+                _WRITER_QUEUES.discard(state.writer_queue)
+                state.writer_queue = None
+
+    def close(self):
+        """finish pending cache writes, stop background writer, remove session from pool and
+        close adapters"""
+        self.stop_writer()
+        state = getattr(self, '_s', None)
+        if state:
+            with _POOL_LOCK:
+                if _POOL.get(state.cache_file_path) is self:
+                    del _POOL[state.cache_file_path]
+        super().close()
+
+    def __getstate__(self) -> dict:
+        """pickle only the state needed to restore a session"""
+        return {
+            'cookies': self.cookies,
+            'headers': dict(self.headers),
+            'proxies': self.proxies,
+            'auth': self.auth,
+            'cache_file_path': self.cache_file_path,
+            'cache_timeout': self.cache_timeout,
+            'cache_type': self.cache_type,
+        }
+
+    def __setstate__(self, state: dict):
+        """rebuild session from pickled state"""
+        super().__init__()
+        self.logger = LOGGER
+        self._s = _SessionState(
+            state['cache_file_path'], state['cache_timeout'], state['cache_type'])
+        self._login_cache = {}
+        self.restore_state(state)
+
+    def restore_state(self, state: dict):
+        """restore session attributes (cookies, headers, proxies, auth) from state
+
+        Arguments:
+            state {dict} -- state as returned by `__getstate__`
+        """
+        for key in SESSION_STATE_KEYS:
+            value = state[key]
+            if key == 'headers':
+                value = requests.structures.CaseInsensitiveDict(value)
+            setattr(self, key, value)
+
+    def encode_state(self) -> dict:
+        """state as plain data that can be written to cache file
+
+        Returns:
+            dict -- state with cookies as lists and cache type as its value
+        """
+        auth = self.auth
+        if type(auth) is requests.auth.HTTPBasicAuth:  # pylint: disable=unidiomatic-typecheck
+            auth = (auth.username, auth.password)
+        if auth is not None and not isinstance(auth, tuple):
+            LOGGER.debug('Auth of type %s is not cached', type(auth).__name__)
+            auth = None
+        return {
+            'cookies': [cookie_to_list(cookie) for cookie in self.cookies_snapshot()],
+            'headers': dict(self.headers),
+            'proxies': self.proxies,
+            'auth': list(auth) if auth else None,
+            'cache_file_path': self.cache_file_path,
+            'cache_timeout': self.cache_timeout,
+            'cache_type': self.cache_type.value,
+        }
+
+    @staticmethod
+    def decode_state(data: dict) -> dict:
+        """state from data returned by `encode_state`
+
+        Arguments:
+            data {dict} -- encoded state
+        Raises:
+            TypeError, KeyError, ValueError -- if data is malformed
+        Returns:
+            dict -- state as returned by `__getstate__`
+        """
+        cookies = requests.cookies.RequestsCookieJar()
+        for values in data['cookies']:
+            cookies.set_cookie(cookie_from_list(values))
+        return {
+            'cookies': cookies,
+            'headers': dict(data['headers']),
+            'proxies': dict(data['proxies']),
+            'auth': tuple(data['auth']) if data['auth'] else None,
+            'cache_file_path': data['cache_file_path'],
+            'cache_timeout': data['cache_timeout'],
+            'cache_type': CacheType(data['cache_type']),
+        }
 
     def load_session(self) -> bool:
         """Load session from cache
@@ -214,41 +617,112 @@ class Session(requests.Session):
         Returns:
             bool -- if session loaded
         """
-        self.i('Check session cache')
-        if not os.path.exists(self.cache_file_path):
-            self.i('Cache file not found')
+        LOGGER.info('Check session cache')
+        if not self.cache_file_path:
+            return False
+        try:
+            stat = os.stat(self.cache_file_path)
+        except OSError:
+            LOGGER.info('Cache file not found')
             return False
 
-        time = datetime.fromtimestamp(
-            os.path.getmtime(self.cache_file_path))
         # only load if last access time of file is less than max session time
-        last_modified_time = (datetime.now() - time).seconds
-        self.i('Cache file found (last accessed %ss ago)', last_modified_time)
+        age = time.time() - stat.st_mtime
+        LOGGER.info('Cache file found (last accessed %ds ago)', age)
 
-        if last_modified_time < self.cache_timeout:
+        if age < self.cache_timeout:
             with open(self.cache_file_path, "rb") as file:
                 error = False
-                session = None
+                state = None
                 try:
-                    session = pickle.load(file)
-                except pickle.UnpicklingError:
+                    state = self.decode_state(deserialize(decompress(file.read())))
+                except (ValueError, TypeError, KeyError, IndexError):
                     error = True
 
-                if error or not isinstance(session, Session):
-                    self.i('Cache file corrupted')
+                if error:
+                    LOGGER.info('Cache file corrupted')
                     return False
-                self.__dict__.update(session.__dict__)
-                self.i('Cached session restored')
+                self.restore_state(state)
+                self._s.last_hash = self.state_hash()
+                LOGGER.info('Cached session restored')
             return True
-        self.i('Cache expired (older than %s)', self.cache_timeout)
+        LOGGER.info('Cache expired (older than %s)', self.cache_timeout)
         return False
 
-    def cache_session(self):
-        """Save session to a cache file."""
+    def cache_session(self, background: bool = False):
+        """Save session to a cache file.
+
+        Keyword Arguments:
+            background {bool} -- write file in a background thread, falls back to writing
+                synchronously if too many writes are pending (default: {False})
+        """
         # always save (to update timeout)
-        self.i('Cache Session')
-        with open(self.cache_file_path, "wb") as file:
-            pickle.dump(self, file)
+        LOGGER.info('Cache Session')
+        state = self._s
+        with state.lock:
+            state.dirty = False
+            _DIRTY_SESSIONS.discard(self)
+            state.last_flush = time.monotonic()
+            if state.flush_timer:
+                state.flush_timer.cancel()
+                state.flush_timer = None
+            state_hash = self.state_hash()
+            if state_hash == state.last_hash:
+                # nothing changed since last save, only update timeout
+                try:
+                    os.utime(self.cache_file_path)
+                    return
+                except FileNotFoundError:
+                    pass
+            # serialize in memory first so that the file sees a single write
+            try:
+                data = compress(serialize(self.encode_state()))
+            except (TypeError, ValueError):
+                # don't fail the request or login that triggered caching
+                LOGGER.exception('Failed to serialize session, cache not saved')
+                return
+            if background:
+                if not state.writer_queue:
+                    state.writer_queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+                    _WRITER_QUEUES.add(state.writer_queue)
+                    threading.Thread(
+                        target=_write_cache_files, args=(state.writer_queue,),
+                        daemon=True).start()
+                try:
+                    # writer resets the hash if the write fails
+                    state.last_hash = state_hash
+                    state.writer_queue.put_nowait((state, self.cache_file_path, data))
+                    return
+                except queue.Full:
+                    state.last_hash = None
+            # pending background writes are older, let them finish so they don't overwrite this
+            self.wait_for_writes()
+            # synchronous saves (login, manual, exit) are the ones callers rely on, make them
+            # durable, batched background writes are superseded by the next one anyway
+            atomic_write(self.cache_file_path, data, fsync=True)
+            state.last_hash = state_hash
+
+    def cookies_snapshot(self) -> list:
+        """list of cookies, taken under cookie jar's lock so that responses being processed on
+        another thread can't change the jar while it is iterated
+
+        Returns:
+            list -- cookies
+        """
+        with self.cookies._cookies_lock:  # pylint: disable=protected-access
+            return list(self.cookies)
+
+    def state_hash(self) -> int:
+        """cheap fingerprint of cached session attributes, used to skip redundant writes
+
+        Returns:
+            int -- hash of cookies, headers, proxies and auth
+        """
+        cookies = frozenset(
+            (cookie.domain, cookie.path, cookie.name, cookie.value, cookie.expires)
+            for cookie in self.cookies_snapshot())
+        return hash((cookies, frozenset(self.headers.items()),
+                     frozenset(self.proxies.items()), repr(self.auth)))
 
     def is_logged_in(self, login_url: str) -> bool:
         """Return if logged in
@@ -258,25 +732,61 @@ class Session(requests.Session):
         Returns:
             bool -- log in status
         """
-        self.d('Check login - %s', login_url)
+        LOGGER.debug('Check login - %s', login_url)
         if not login_url:
             return False
+        cached = self._login_cache.get(login_url)
+        if cached and time.monotonic() - cached[1] < LOGIN_CHECK_TTL:
+            LOGGER.debug('Using cached login status')
+            return cached[0]
         res = self.get(login_url, allow_redirects=False)
-        if res.status_code == 302:
-            self.i('Is logged in')
-            return True
-        self.i('Is not logged in')
-        return False
+        is_logged_in = res.status_code == 302
+        self._login_cache[login_url] = (is_logged_in, time.monotonic())
+        LOGGER.info('Is logged in' if is_logged_in else 'Is not logged in')
+        return is_logged_in
 
     def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
         res = super().send(request, **kwargs)
-        if self.cache_type == CacheType.AFTER_EACH_REQUEST or (
-                self.cache_type == CacheType.AFTER_EACH_POST and
+        state = self._s
+        cache_type = state.cache_type
+        if cache_type == CacheType.AFTER_EACH_REQUEST or (
+                cache_type == CacheType.AFTER_EACH_POST and
                 request.method and request.method.lower() == 'post'
         ):
-            self.cache_session()
+            with state.lock:
+                state.dirty = True
+                _DIRTY_SESSIONS.add(self)
+                self.flush_session()
         return res
 
+    def flush_session(self, force: bool = False):
+        """Cache session if it has pending changes. Writes are batched so that at most one
+        happens per flush interval, remaining changes are written by a trailing timer.
+
+        Keyword Arguments:
+            force {bool} -- write now and wait for it, ignoring flush interval (default: {False})
+        """
+        state = self._s
+        with state.lock:
+            if not state.dirty:
+                return
+            if force:
+                self.cache_session()
+                return
+            wait = state.flush_interval - (time.monotonic() - state.last_flush)
+            if wait <= 0:
+                self.cache_session(background=True)
+            elif not state.flush_timer:
+                state.flush_timer = threading.Timer(wait, self._flush_on_timer)
+                state.flush_timer.daemon = True
+                state.flush_timer.start()
+
+    def _flush_on_timer(self):
+        """trailing flush, clears the timer first so that later changes schedule a new one"""
+        with self._s.lock:
+            self._s.flush_timer = None
+            self.flush_session()
+
     def get_cache_file_path(self) -> str:
         """get cache file's path
 
@@ -284,3 +794,15 @@ class Session(requests.Session):
             str -- cache file's path
         """
         return self.cache_file_path
+
+
+@atexit.register
+def clear_pool():
+    """Save and close all sessions in pool. Called at exit, as sessions kept alive by the pool
+    until module teardown can't save themselves in `__del__` anymore."""
+    with _POOL_LOCK:
+        sessions = list(_POOL.values())
+        _POOL.clear()
+    for session in sessions:
+        session.save_on_exit()
+        session.close()
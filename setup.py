@@ -30,6 +30,7 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=['requests'],
+    extras_require={'lz4': ['lz4'], 'msgpack': ['msgpack']},
     keywords='requests session persistent login utility development',
     project_urls={
         'Documentation': 'https://github.com/rishabhsingh971/persession/README.md',
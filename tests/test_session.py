@@ -0,0 +1,100 @@
+""" Tests for session caching. """
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from persession import CacheType, Session, clear_pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class CookieHandler(BaseHTTPRequestHandler):
+    """sets `sid` cookie to the request path without leading slash"""
+
+    def _respond(self):
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'sid={}; Path=/'.format(self.path.lstrip('/')))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class CacheTest(unittest.TestCase):
+    """session cache tests against a local http server"""
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), CookieHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache_file_path = os.path.join(temp_dir.name, 'cache.dat')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def load_cookies(self) -> dict:
+        """cookies of a new session loaded from cache file"""
+        session = Session(self.cache_file_path, cache_type=CacheType.MANUAL)
+        return session.cookies.get_dict()
+
+    def test_unreachable_cache_file_is_not_found(self):
+        # parent of cache file is a regular file
+        with open(self.cache_file_path, 'w'):
+            pass
+        session = Session(os.path.join(self.cache_file_path, 'cache.dat'))
+        self.assertEqual(session.cookies.get_dict(), {})
+
+    def test_first_request_is_cached_at_once(self):
+        session = Session(self.cache_file_path, cache_type=CacheType.AFTER_EACH_REQUEST)
+        session.get(self.url + '/v1')
+        session.wait_for_writes()
+        self.assertEqual(self.load_cookies(), {'sid': 'v1'})
+        session.close()
+
+    def test_batched_requests_are_cached_on_exit(self):
+        with Session(self.cache_file_path, cache_type=CacheType.AFTER_EACH_REQUEST) as session:
+            session.post(self.url + '/v1')
+            session.get(self.url + '/v2')
+        self.assertEqual(self.load_cookies(), {'sid': 'v2'})
+
+    def test_batched_requests_are_cached_at_interpreter_exit(self):
+        # session is neither closed nor used as context manager, the trailing timer would be
+        # killed at exit
+        script = '\n'.join([
+            'from persession import CacheType, Session',
+            'session = Session({!r}, cache_type=CacheType.AFTER_EACH_REQUEST)',
+            'session.post({!r})',
+            'session.get({!r})',
+        ]).format(self.cache_file_path, self.url + '/v1', self.url + '/v2')
+        subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True, timeout=30)
+        self.assertEqual(self.load_cookies(), {'sid': 'v2'})
+
+    def test_pooled_session_is_saved_at_interpreter_exit(self):
+        script = '\n'.join([
+            'from persession import CacheType, Session',
+            'Session.from_pool({!r}, cache_type=CacheType.AT_EXIT).get({!r})',
+        ]).format(self.cache_file_path, self.url + '/v1')
+        subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True, timeout=30)
+        self.assertEqual(self.load_cookies(), {'sid': 'v1'})
+
+    def test_closed_session_leaves_pool(self):
+        session = Session.from_pool(self.cache_file_path, cache_type=CacheType.AT_EXIT)
+        self.assertIs(Session.from_pool(self.cache_file_path), session)
+        with session:
+            pass
+        self.assertIsNot(Session.from_pool(self.cache_file_path), session)
+        clear_pool()
+
+
+if __name__ == '__main__':
+    unittest.main()